@@ -8,4 +8,5 @@ You can run the agent by executing this command:
 
 from vigi.cli import main
 
-main()
+if __name__ == "__main__":
+    main()
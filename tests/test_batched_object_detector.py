@@ -0,0 +1,125 @@
+"""
+Tests for the BatchedObjectDetector class.
+"""
+
+import time
+import threading
+import unittest
+
+from vigi.batched_object_detector import BatchedObjectDetector
+
+class FakeModel:
+    """
+    A model that returns the frame itself as the result and records the batches.
+    The first call is blocked until it's released, so the next calls are batched.
+    """
+    def __init__(self):
+        self.batches = []
+        self.kwargs = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, frames, **kwargs):
+        self.started.set()
+        self.release.wait(5)
+        self.batches.append(list(frames))
+        self.kwargs.append(kwargs)
+        return list(frames)
+
+def detect_concurrently(detector, frames):
+    """
+    Run the detector for each frame in a separate thread and return
+    the results or the exceptions in the order of the frames.
+    """
+    results = [None] * len(frames)
+
+    def detect(i):
+        try:
+            results[i] = detector(frames[i], verbose=False)
+        except Exception as e: # pylint: disable=broad-except
+            results[i] = e
+
+    threads = [threading.Thread(target=detect, args=(i,)) for i in range(len(frames))]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+def wait_for_requests(detector, count):
+    """Wait until the given number of requests is queued in the detector."""
+    requests = detector._requests # pylint: disable=protected-access
+    deadline = time.monotonic() + 5
+    while requests.qsize() < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+class TestBatchedObjectDetector(unittest.TestCase):
+    """
+    Test the BatchedObjectDetector class
+    """
+    def test_single_frame(self):
+        """Test that a single frame is detected and the kwargs are passed to the model."""
+        model = FakeModel()
+        model.release.set()
+        detector = BatchedObjectDetector(model)
+
+        self.assertEqual(detector('frame', device='cpu'), ['frame'])
+        self.assertEqual(model.kwargs, [{'device': 'cpu'}])
+
+    def test_concurrent_frames_are_batched(self):
+        """Test that the frames submitted at the same time are detected in one batch."""
+        model = FakeModel()
+        detector = BatchedObjectDetector(model)
+
+        # the first frame blocks the model, while the others are queued
+        threads, results = detect_concurrently(detector, ['a'])
+        model.started.wait(5)
+        more_threads, more_results = detect_concurrently(detector, ['b', 'c', 'd'])
+        wait_for_requests(detector, 3)
+
+        model.release.set()
+        for thread in threads + more_threads:
+            thread.join(5)
+
+        # each caller gets the result for its own frame
+        self.assertEqual(results, [['a']])
+        self.assertEqual(more_results, [['b'], ['c'], ['d']])
+        self.assertEqual(model.batches[0], ['a'])
+        self.assertEqual(sorted(model.batches[1]), ['b', 'c', 'd'])
+
+    def test_max_batch_size(self):
+        """Test that a batch is not larger than max_batch_size."""
+        model = FakeModel()
+        detector = BatchedObjectDetector(model, max_batch_size=2)
+
+        threads, results = detect_concurrently(detector, ['a'])
+        model.started.wait(5)
+        more_threads, more_results = detect_concurrently(detector, ['b', 'c', 'd', 'e'])
+        wait_for_requests(detector, 4)
+
+        model.release.set()
+        for thread in threads + more_threads:
+            thread.join(5)
+
+        self.assertEqual(results + more_results, [['a'], ['b'], ['c'], ['d'], ['e']])
+        self.assertEqual([len(batch) for batch in model.batches], [1, 2, 2])
+
+    def test_exception_is_propagated(self):
+        """Test that the exception of the model is raised to all the callers of the batch."""
+        def failing_model(frames, **_kwargs):
+            raise ValueError(f"failed to detect {len(frames)} frames")
+
+        detector = BatchedObjectDetector(failing_model)
+        with self.assertRaises(ValueError):
+            detector('frame')
+
+    def test_missing_results(self):
+        """Test that the callers don't wait forever if the model returns fewer results."""
+        def short_model(frames, **_kwargs):
+            return frames[:-1]
+
+        detector = BatchedObjectDetector(short_model)
+        threads, results = detect_concurrently(detector, ['a'])
+        for thread in threads:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+        self.assertIsInstance(results[0], RuntimeError)
@@ -0,0 +1,156 @@
+"""
+Tests for the CameraMonitor class with a fake camera, motion detector and video recorder.
+"""
+
+import os
+import time
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import cv2
+
+from vigi.camera_monitor import CameraMonitor
+from vigi.database import Database
+
+class FakeCamera:
+    """
+    A camera that returns the given number of black frames at 100 FPS.
+    """
+    def __init__(self, frames_count):
+        self.frames_count = frames_count
+        self.grabbed = 0
+
+    def get(self, prop_id):
+        """Returns the frame size and FPS of the camera."""
+        return {cv2.CAP_PROP_FRAME_WIDTH: 8, cv2.CAP_PROP_FRAME_HEIGHT: 6,
+                cv2.CAP_PROP_FPS: 100}.get(prop_id, 0)
+
+    def grab(self):
+        """Grab the next frame, fails when there are no more frames."""
+        if self.grabbed >= self.frames_count:
+            return False
+        time.sleep(0.01)
+        self.grabbed += 1
+        return True
+
+    def retrieve(self, image):
+        """Return the grabbed frame."""
+        image[...] = 0
+        return True, image
+
+    def isOpened(self): # pylint: disable=invalid-name
+        """The camera is always opened."""
+        return True
+
+    def release(self):
+        """Nothing to release."""
+
+class FakeMotionDetector:
+    """
+    A motion detector that detects motion in every frame.
+    """
+    def __init__(self):
+        self.motion_callback = None
+        self.motion_detected = False
+
+    def set_motion_callback(self, motion_callback):
+        """Set the motion callback."""
+        self.motion_callback = motion_callback
+
+    def specialize(self, frame_width, frame_height):
+        """Nothing to precompute."""
+
+    def is_motion_detected(self):
+        """Returns True after the first frame."""
+        return self.motion_detected
+
+    def update(self, frame):
+        """Detect motion in the frame."""
+        if not self.motion_detected:
+            self.motion_detected = True
+            self.motion_callback()
+        return frame, set()
+
+class FailingVideoRecorder:
+    """
+    A video recorder that fails to write the frame after the given number of frames.
+    """
+    def __init__(self, fail_after):
+        self.fail_after = fail_after
+        self.frames_count = 0
+        self.recording = False
+        self.recording_start_date = '2024-01-01'
+        self.recording_start_time = '00-00-00'
+
+    def is_recording(self):
+        """Returns True if the video is being recorded."""
+        return self.recording
+
+    def start_recording(self, **_kwargs):
+        """Start recording."""
+        self.recording = True
+
+    def end_recording(self):
+        """End recording."""
+        self.recording = False
+
+    def add_frame(self, _frame):
+        """Write the frame, fails after fail_after frames."""
+        self.frames_count += 1
+        if self.frames_count > self.fail_after:
+            raise OSError("No space left on device")
+
+class TestCameraMonitor(unittest.TestCase):
+    """
+    Test the CameraMonitor class
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory() # pylint: disable=consider-using-with
+        self.db_path = os.path.join(self.tmp_dir.name, 'vigi.db')
+        database = Database(self.db_path)
+        database.init_db()
+        database.close()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_stops_when_video_recorder_fails(self):
+        """
+        Test that the camera monitor stops, instead of hanging, if the video recorder
+        fails to write a frame in the writer thread.
+        """
+        video_recorder = FailingVideoRecorder(fail_after=20)
+        camera_monitor = CameraMonitor(video_recorder=video_recorder,
+                                       max_errors=1,
+                                       notifier=mock.Mock(),
+                                       db_path=self.db_path,
+                                       motion_detector=FakeMotionDetector())
+
+        # the exception is re-raised in the camera monitor thread, don't print it
+        with mock.patch('vigi.camera_monitor.open_capture', return_value=FakeCamera(200)), \
+                mock.patch.object(threading, 'excepthook'):
+            camera_monitor.start()
+            camera_monitor.join(10)
+
+        self.assertFalse(camera_monitor.is_alive())
+        self.assertFalse(video_recorder.is_recording())
+
+    def test_decode_stride_is_stable(self):
+        """
+        Test that the FPS jitter doesn't change the decode stride,
+        but a real change of the FPS does.
+        """
+        camera_monitor = CameraMonitor(video_recorder=FailingVideoRecorder(fail_after=0),
+                                       motion_detector=FakeMotionDetector(),
+                                       target_analysis_fps=10)
+        capture_worker = mock.Mock()
+
+        # pylint: disable=protected-access
+        for fps in [30, 29, 30, 31, 29, 32, 28]:
+            camera_monitor._set_capture_rate(capture_worker, fps)
+            self.assertEqual(capture_worker.decode_stride, 3)
+
+        camera_monitor._set_capture_rate(capture_worker, 60)
+        self.assertEqual(capture_worker.decode_stride, 6)
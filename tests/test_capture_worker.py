@@ -0,0 +1,215 @@
+"""
+Tests for the capture worker of the camera monitor.
+"""
+
+import time
+import itertools
+import unittest
+from unittest import mock
+
+from vigi.camera_monitor import _CaptureWorker
+
+class FakeCamera:
+    """
+    A camera that returns the given number of frames as fast as possible.
+    The first pixel of each frame is set to the index of the frame.
+    """
+    def __init__(self, frames_count):
+        self.frames_count = frames_count
+        self.grabbed = 0
+        # the indexes of the decoded frames
+        self.retrieved = []
+
+    def grab(self):
+        """Grab the next frame, fails when there are no more frames."""
+        if self.grabbed >= self.frames_count:
+            return False
+        self.grabbed += 1
+        return True
+
+    def retrieve(self, image):
+        """Write the index of the grabbed frame to the image."""
+        image.flat[0] = self.grabbed
+        self.retrieved.append(self.grabbed)
+        return True, image
+
+    def isOpened(self): # pylint: disable=invalid-name
+        """The camera is always opened."""
+        return True
+
+class FlakyCamera(FakeCamera):
+    """
+    A camera that fails or succeeds to grab a frame according to the plan,
+    an iterable of booleans. The first pixel of each frame is set to the number
+    of successfully grabbed frames.
+    """
+    def __init__(self, plan):
+        super().__init__(frames_count=None)
+        self.plan = iter(plan)
+
+    def grab(self):
+        """Grab the next frame according to the plan."""
+        if not next(self.plan):
+            return False
+        self.grabbed += 1
+        return True
+
+    def release(self):
+        """The camera is reopened, nothing to release."""
+
+def read_frames(worker, delay=0):
+    """Read the frames from the worker until it stops and return their indexes."""
+    frames = []
+    while True:
+        frame = worker.latest(timeout=1)
+        if frame is None:
+            return frames
+        frames.append(int(frame.flat[0]))
+        # simulate a slow processing of the frame
+        time.sleep(delay)
+
+class TestCaptureWorker(unittest.TestCase):
+    """
+    Test the _CaptureWorker class
+    """
+    def test_all_frames_are_delivered_while_recording(self):
+        """Test that no frame is overwritten while the video is being recorded."""
+        worker = _CaptureWorker(FakeCamera(50), camera_id=0, frame_width=4, frame_height=4,
+                                max_errors=1)
+        worker.decode_all = lambda: True
+        worker.start()
+
+        frames = read_frames(worker, delay=0.005)
+        worker.stop()
+
+        self.assertEqual(frames, list(range(1, 51)))
+
+    def test_frames_are_skipped_while_not_recording(self):
+        """Test that only every Nth frame is decoded while the video is not being recorded."""
+        worker = _CaptureWorker(FakeCamera(50), camera_id=0, frame_width=4, frame_height=4,
+                                max_errors=1)
+        worker.decode_stride = 5
+        worker.start()
+
+        frames = read_frames(worker)
+        worker.stop()
+
+        self.assertTrue(frames)
+        self.assertTrue(all(frame % 5 == 0 for frame in frames))
+
+    def test_stop_while_waiting_for_consumer(self):
+        """
+        Test that the capture stalls when the consumer doesn't take the frames while recording,
+        e.g. when it's blocked by the full write queue, and that the worker could be stopped.
+        """
+        camera = FakeCamera(50)
+        worker = _CaptureWorker(camera, camera_id=0, frame_width=4, frame_height=4,
+                                max_errors=1)
+        worker.decode_all = lambda: True
+        worker.start()
+
+        # nobody takes the frames, so the worker waits for the consumer
+        time.sleep(0.1)
+        worker.stop()
+
+        self.assertFalse(worker.is_alive())
+        # the capture is stalled: the pending frame and the next grabbed one
+        self.assertEqual(camera.grabbed, 2)
+        # the pending frame hasn't been overwritten
+        self.assertEqual(worker.latest(timeout=0).flat[0], 1)
+
+    def test_reopen_after_errors(self):
+        """
+        Test that the camera is reopened every REOPEN_AFTER_ERRORS consecutive errors,
+        and the error count is reset after a frame is read successfully.
+        """
+        # 12 errors: reopened twice, then 4 errors: not reopened if the count is reset
+        camera = FlakyCamera(itertools.chain([False] * 12, [True] * 5, [False] * 4,
+                                             itertools.repeat(True)))
+        with mock.patch('vigi.camera_monitor.RETRY_MAX_DELAY', 0.001), \
+                mock.patch('vigi.camera_monitor.open_capture',
+                           return_value=camera) as open_capture:
+            worker = _CaptureWorker(camera, camera_id=0, frame_width=4, frame_height=4,
+                                    max_errors=50, source='rtsp://camera')
+            worker.decode_all = lambda: True
+            worker.start()
+
+            frames = []
+            while len(frames) < 10:
+                frame = worker.latest(timeout=5)
+                self.assertIsNotNone(frame)
+                frames.append(int(frame.flat[0]))
+            worker.stop()
+
+        self.assertEqual(frames, list(range(1, 11)))
+        self.assertEqual(open_capture.call_count, 2)
+        open_capture.assert_called_with('rtsp://camera')
+
+    def test_local_camera_is_not_reopened(self):
+        """
+        Test that an opened local camera or a video file is not reopened after errors.
+        """
+        camera = FlakyCamera(itertools.repeat(False))
+        with mock.patch('vigi.camera_monitor.RETRY_MAX_DELAY', 0.001), \
+                mock.patch('vigi.camera_monitor.open_capture') as open_capture:
+            worker = _CaptureWorker(camera, camera_id=0, frame_width=4, frame_height=4,
+                                    max_errors=20, source='video.mp4')
+            worker.start()
+            worker.join(5)
+
+        self.assertFalse(worker.is_alive())
+        open_capture.assert_not_called()
+
+    def test_stop_interrupts_backoff(self):
+        """
+        Test that stop() doesn't wait for the end of the backoff delay.
+        """
+        camera = FlakyCamera(itertools.repeat(False))
+        with mock.patch('vigi.camera_monitor.RETRY_BASE_DELAY', 10), \
+                mock.patch('vigi.camera_monitor.RETRY_MAX_DELAY', 60):
+            worker = _CaptureWorker(camera, camera_id=0, frame_width=4, frame_height=4,
+                                    max_errors=50)
+            worker.start()
+
+            # the worker is waiting for 20 seconds after the first error
+            time.sleep(0.1)
+            started = time.monotonic()
+            worker.stop()
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertFalse(worker.is_alive())
+
+    def test_stale_frames_are_dropped(self):
+        """
+        Test that the frames grabbed at once (buffered by the backend) are dropped,
+        but no more than max_drained frames in a row.
+        """
+        camera = FakeCamera(40)
+        worker = _CaptureWorker(camera, camera_id=0, frame_width=4, frame_height=4,
+                                max_errors=1)
+        # the fake camera returns the frames at once, so all of them look stale
+        worker.stale_grab_time = 1
+        worker.max_drained = 3
+        worker.start()
+        worker.join(5)
+
+        # 3 stale frames are dropped, then the next one is decoded
+        self.assertEqual(camera.retrieved, list(range(4, 41, 4)))
+
+    def test_stale_frames_are_not_dropped_while_recording(self):
+        """
+        Test that the stale frames are not dropped while the video is being recorded.
+        """
+        camera = FakeCamera(40)
+        worker = _CaptureWorker(camera, camera_id=0, frame_width=4, frame_height=4,
+                                max_errors=1)
+        worker.stale_grab_time = 1
+        worker.max_drained = 3
+        worker.decode_all = lambda: True
+        worker.start()
+
+        frames = read_frames(worker)
+        worker.stop()
+
+        self.assertEqual(frames, list(range(1, 41)))
+        self.assertEqual(camera.retrieved, list(range(1, 41)))
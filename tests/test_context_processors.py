@@ -37,3 +37,13 @@ class TestUtilityProcessor(unittest.TestCase):
         Test formatting of duration in minutes
         """
         self.assertEqual(self.utilities['format_duration'](60), "1 minute")
+
+    def test_format_duration_float(self):
+        """
+        Test formatting of float durations, they are rounded to whole seconds
+        """
+        self.assertEqual(self.utilities['format_duration'](1.4), "1 second")
+        self.assertEqual(self.utilities['format_duration'](11.0), "11 seconds")
+        self.assertEqual(self.utilities['format_duration'](60.3), "1 minute")
+        self.assertEqual(self.utilities['format_duration'](119.6), "2 minutes")
+        self.assertEqual(self.utilities['format_duration'](3600.2), "1 hour")
@@ -18,7 +18,7 @@ class MediaTestCase(unittest.TestCase):
         self.assertEqual(meta["frame_height"], 1080)
         self.assertEqual(meta["fps"], 30.0)
         self.assertEqual(meta["frame_count"], 331)
-        self.assertEqual(meta["duration"], 11.0)
+        self.assertAlmostEqual(meta["duration"], 11.0, delta=0.1)
 
     def test_generate_preview(self):
         """
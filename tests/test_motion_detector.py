@@ -13,8 +13,10 @@ rather static scenes with some noise or light changes
 import os
 from glob import glob
 import unittest
+from unittest import mock
 
 import cv2
+import numpy as np
 
 from vigi.motion_detector import MotionDetector
 
@@ -77,3 +79,89 @@ class MotionDetectorTestCase(unittest.TestCase):
             processor.process()
 
             self.assertTrue(processor.motion_detected)
+
+
+def intersection_over_union(box1, box2):
+    """
+    Calculate the intersection over union of two boxes (x1, y1, x2, y2)
+    """
+    width = min(box1[2], box2[2]) - max(box1[0], box2[0])
+    height = min(box1[3], box2[3]) - max(box1[1], box2[1])
+    if width <= 0 or height <= 0:
+        return 0
+
+    intersection = width * height
+    area1 = (box1[2] - box1[0]) * (box1[3] - box1[1])
+    area2 = (box2[2] - box2[0]) * (box2[3] - box2[1])
+    return intersection / (area1 + area2 - intersection)
+
+
+class SyntheticMotionDetectorTestCase(unittest.TestCase):
+    """
+    Test the motion detector on synthetic full HD frames, the sample videos are not required.
+    The frames are downscaled for the motion detection, so these tests check that
+    the detection still works at the full resolution and the detections are scaled back.
+    """
+    WIDTH, HEIGHT = 1920, 1080
+    BLOCK_SIZE = 200
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        background = np.full((self.HEIGHT, self.WIDTH, 3), 100, dtype=np.int16)
+        # a few frames with the sensor noise, they are cycled to save time
+        self.noisy_frames = [
+            np.clip(background + rng.normal(0, 4, background.shape), 0, 255).astype(np.uint8)
+            for _ in range(5)
+        ]
+
+    def noisy_frame(self, index):
+        """Return a static scene with noise."""
+        return self.noisy_frames[index % len(self.noisy_frames)].copy()
+
+    def warm_up(self, motion_detector):
+        """Feed the static scene to the motion detector until it's warmed up."""
+        for i in range(motion_detector.skip_frames_count + 10):
+            motion_detector.update(self.noisy_frame(i))
+
+    def test_moving_block(self):
+        """
+        A moving block should be detected and its bounding box should be
+        in the coordinates of the full resolution frame
+        """
+        motion_detector = MotionDetector(debug=True)
+        motion_callback = mock.Mock()
+        motion_detector.set_motion_callback(motion_callback)
+        self.warm_up(motion_detector)
+
+        x, y = 500, 400
+        with mock.patch('vigi.motion_detector.draw_bboxes') as draw_bboxes:
+            for _ in range(10):
+                x += 40
+                frame = self.noisy_frame(x)
+                frame[y:y + self.BLOCK_SIZE, x:x + self.BLOCK_SIZE] = 255
+                motion_detector.update(frame)
+
+        self.assertTrue(motion_detector.is_motion_detected())
+        motion_callback.assert_called_once()
+
+        # The last detections should contain the box of the block in the full resolution.
+        # The box could be a bit off, because the background model partially learned
+        # the previous positions of the block, so the intersection over union is checked.
+        block = (x, y, x + self.BLOCK_SIZE, y + self.BLOCK_SIZE)
+        detections = draw_bboxes.call_args[0][1]
+        self.assertTrue(any(intersection_over_union(box, block) > 0.7 for box in detections),
+                        f"No detection of the block {block} in {detections}")
+
+    def test_static_noisy_scene(self):
+        """
+        A static scene with the sensor noise should not be detected as motion
+        """
+        motion_detector = MotionDetector()
+        motion_callback = mock.Mock()
+        motion_detector.set_motion_callback(motion_callback)
+
+        for i in range(150):
+            motion_detector.update(self.noisy_frame(i))
+
+        self.assertFalse(motion_detector.is_motion_detected())
+        motion_callback.assert_not_called()
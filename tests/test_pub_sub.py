@@ -4,52 +4,116 @@ Tests for the PubSub class.
 
 import unittest
 import queue
+import threading
+
+import numpy as np
 
 from vigi.utils.pub_sub import PubSub
 
+def make_frame(value):
+    """Create a small frame filled with the given value."""
+    return np.full((4, 6, 3), value, dtype=np.uint8)
+
 class TestPubSub(unittest.TestCase):
     """
     Test the PubSub class
     """
     def test_single_subscription(self):
-        """Test that a single subscriber receives messages."""
+        """Test that a single subscriber receives frames."""
 
         pubsub = PubSub()
-        q = pubsub.subscribe()
+        subscriber = pubsub.subscribe()
 
-        test_message = "Hello, World!"
-        pubsub.publish(test_message)
+        test_frame = make_frame(1)
+        pubsub.publish(test_frame)
 
-        self.assertEqual(q.get(), test_message)
-        pubsub.unsubscribe(q)
+        np.testing.assert_array_equal(subscriber.get(), test_frame)
+        pubsub.unsubscribe(subscriber)
 
 
     def test_multiple_subscriptions(self):
-        """Test that multiple subscribers receive messages."""
+        """Test that multiple subscribers receive frames."""
 
         pubsub = PubSub()
-        queues = [pubsub.subscribe() for _ in range(3)]
-        test_message = "Hello, Multiworld!"
-        pubsub.publish(test_message)
+        subscribers = [pubsub.subscribe() for _ in range(3)]
+        test_frame = make_frame(2)
+        pubsub.publish(test_frame)
 
-        for q in queues:
-            self.assertEqual(q.get(), test_message)
-            pubsub.unsubscribe(q)
+        for subscriber in subscribers:
+            np.testing.assert_array_equal(subscriber.get(), test_frame)
+            pubsub.unsubscribe(subscriber)
 
-    def test_unsubscribe(self):
-        """Test that unsubscribing prevents receiving messages."""
+    def test_no_new_frames(self):
+        """Test that get raises queue.Empty if there are no new frames."""
         pubsub = PubSub()
-        queue1 = pubsub.subscribe()
-        queue2 = pubsub.subscribe()
-        pubsub.unsubscribe(queue1)
+        subscriber = pubsub.subscribe()
 
-        test_message = "Test Unsubscribe"
-        pubsub.publish(test_message)
+        pubsub.publish(make_frame(3))
+        subscriber.get()
 
-        # queue1 should not receive any messages since it's unsubscribed
+        # the frame has been already received
         with self.assertRaises(queue.Empty):
-            queue1.get(timeout=1)
+            subscriber.get(timeout=0.1)
+
+    def test_slow_subscriber(self):
+        """Test that a slow subscriber skips to the latest frame."""
+        pubsub = PubSub(slots=4)
+        subscriber = pubsub.subscribe()
+
+        for value in range(10):
+            pubsub.publish(make_frame(value))
+
+        np.testing.assert_array_equal(subscriber.get(), make_frame(9))
+
+    def test_frame_size_change(self):
+        """Test that frames of a different size could be published."""
+        pubsub = PubSub()
+        subscriber = pubsub.subscribe()
+
+        pubsub.publish(make_frame(1))
+        subscriber.get()
+
+        test_frame = np.ones((8, 8, 3), dtype=np.uint8)
+        pubsub.publish(test_frame)
+        np.testing.assert_array_equal(subscriber.get(), test_frame)
+
+    def test_frame_is_copied(self):
+        """Test that a received frame is not changed by the next published frames."""
+        pubsub = PubSub(slots=4)
+        subscriber = pubsub.subscribe()
+
+        pubsub.publish(make_frame(1))
+        frame = subscriber.get()
+
+        for value in range(2, 10):
+            pubsub.publish(make_frame(value))
+
+        np.testing.assert_array_equal(frame, make_frame(1))
+
+    def test_no_torn_or_empty_frames(self):
+        """
+        Test that a subscriber reading concurrently with the publisher gets only whole frames,
+        including when the ring is reallocated for frames of a different size.
+        """
+        pubsub = PubSub()
+        subscriber = pubsub.subscribe()
+        frames_count = 2000
+
+        def publish():
+            # the frame size changes every 10 frames, the frames are never filled with 0
+            for value in range(1, frames_count + 1):
+                shape = (4, 6, 3) if (value // 10) % 2 else (8, 8, 3)
+                pubsub.publish(np.full(shape, value % 255 + 1, dtype=np.uint8))
 
-        # queue2 should still receive the message
-        self.assertEqual(queue2.get(), test_message)
-        pubsub.unsubscribe(queue2)
+        publisher = threading.Thread(target=publish)
+        publisher.start()
+        try:
+            while publisher.is_alive() or subscriber.seq < frames_count:
+                try:
+                    frame = subscriber.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                self.assertNotEqual(frame.flat[0], 0)
+                self.assertTrue((frame == frame.flat[0]).all())
+        finally:
+            publisher.join()
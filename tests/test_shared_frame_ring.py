@@ -0,0 +1,92 @@
+"""
+Tests for the SharedFrameRing class.
+"""
+
+import unittest
+import queue
+import multiprocessing
+
+import numpy as np
+
+from vigi.utils.shared_frame_ring import SharedFrameRing
+
+# the frames are published by a spawned process, the same way as by CameraProcess
+CTX = multiprocessing.get_context('spawn')
+
+SMALL_SHAPE = (48, 64, 3)
+LARGE_SHAPE = (96, 128, 3)
+FRAMES_COUNT = 200
+LAST_FRAME = FRAMES_COUNT - 1
+
+def frame_shape(value):
+    """The first half of the frames is small, the second half is large."""
+    return SMALL_SHAPE if value < FRAMES_COUNT // 2 else LARGE_SHAPE
+
+def produce(ring, done):
+    """
+    Publish the frames filled with their index, so a torn frame could be detected.
+    The frame size changes in the middle, so the ring is reallocated.
+    """
+    for value in range(FRAMES_COUNT):
+        ring.publish(np.full(frame_shape(value), value, dtype=np.uint8))
+
+    # keep the shared memory until the consumer has received the last frame
+    done.wait(30)
+    ring.close()
+
+class TestSharedFrameRing(unittest.TestCase):
+    """
+    Test the SharedFrameRing class
+    """
+    def test_single_process(self):
+        """Test that a subscriber receives a copy of the published frame."""
+        ring = SharedFrameRing()
+        subscriber = ring.subscribe()
+
+        test_frame = np.full(SMALL_SHAPE, 1, dtype=np.uint8)
+        ring.publish(test_frame)
+        frame = subscriber.get(timeout=1)
+        np.testing.assert_array_equal(frame, test_frame)
+
+        # the received frame is a copy, it's not changed by the next frames
+        for value in range(2, 10):
+            ring.publish(np.full(SMALL_SHAPE, value, dtype=np.uint8))
+        np.testing.assert_array_equal(frame, test_frame)
+
+        # the frame has been already received
+        np.testing.assert_array_equal(subscriber.get(timeout=1), np.full(SMALL_SHAPE, 9))
+        with self.assertRaises(queue.Empty):
+            subscriber.get(timeout=0.1)
+
+        ring.close()
+
+    def test_spawned_producer(self):
+        """
+        Test that the frames published by a spawned process are received without tearing,
+        including after the ring is reallocated for a different frame size.
+        """
+        ring = SharedFrameRing(ctx=CTX)
+        subscriber = ring.subscribe()
+        done = CTX.Event()
+
+        producer = CTX.Process(target=produce, args=(ring, done))
+        producer.start()
+        try:
+            received = []
+            while not received or received[-1] != LAST_FRAME:
+                frame = subscriber.get(timeout=30)
+                value = int(frame.flat[0])
+
+                self.assertEqual(frame.shape, frame_shape(value))
+                # all the pixels are from the same frame
+                self.assertTrue((frame == value).all())
+                received.append(value)
+
+            # the frames are received in order, slow reads skip frames
+            self.assertEqual(received, sorted(set(received)))
+        finally:
+            done.set()
+            producer.join(30)
+            ring.close()
+
+        self.assertEqual(producer.exitcode, 0)
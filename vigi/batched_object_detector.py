@@ -0,0 +1,72 @@
+"""
+This module contains the BatchedObjectDetector class that shares one object detection
+model between several camera monitors.
+"""
+
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+class BatchedObjectDetector:
+    """
+    Wraps an object detection model (YOLO) to share it between several camera monitors
+    running in separate threads. The frames submitted by different cameras at the same
+    time are run through the model as one batch by a worker thread.
+    It's called the same way as the model, so it could be passed to the MotionDetector.
+    """
+    def __init__(self, model, max_batch_size=8):
+        """
+        model: callable - the object detection model, it should accept a list of frames
+                            and return a list of results, one for each frame
+        max_batch_size: int - the maximum number of frames in one batch
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def __call__(self, frame, **kwargs):
+        """
+        Detect objects in the frame and return the results in the same format as the model.
+        Blocks until the batch with the frame is processed.
+        """
+        future = Future()
+        self._requests.put((frame, kwargs, future))
+        return future.result()
+
+    def _run(self):
+        """
+        Collect the pending requests into batches and run them through the model.
+        """
+        while True:
+            # wait for the first request, then take all the other pending requests
+            batch = [self._requests.get()]
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            frames = [frame for frame, _, _ in batch]
+            # the cameras share the same inference settings
+            kwargs = batch[0][1]
+            try:
+                results = self.model(frames, **kwargs)
+            except Exception as e: # pylint: disable=broad-except
+                logging.error("Object detection failed: %s", e)
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            results = list(results)
+            for i, (_, _, future) in enumerate(batch):
+                if i < len(results):
+                    future.set_result([results[i]])
+                else:
+                    # don't leave the caller waiting forever
+                    future.set_exception(RuntimeError(
+                        f"Object detection returned {len(results)} results "
+                        f"for {len(batch)} frames"))
@@ -8,8 +8,10 @@ class CameraConfig:
     """
     def __init__(self):
         self.camera_id = 0
+        self.url = None
         self.max_errors = 50
         self.sensitivity = 0.5
+        self.target_analysis_fps = 10
 
     def set_camera_id(self, camera_id):
         """
@@ -20,6 +22,14 @@ class CameraConfig:
             raise ValueError('Camera id must be a positive integer')
         self.camera_id = camera_id
 
+    def set_url(self, url):
+        """
+        validate and set the URL of a network camera
+        """
+        if url == '':
+            raise ValueError('Camera URL must not be empty')
+        self.url = url
+
     def set_max_errors(self, max_errors):
         """
         set the maximum number of consecutive errors when reading a frame from the camera
@@ -37,3 +47,12 @@ class CameraConfig:
         if sensitivity < 0 or sensitivity > 1:
             raise ValueError('Sensitivity must be between 0 and 1')
         self.sensitivity = sensitivity
+
+    def set_target_analysis_fps(self, target_analysis_fps):
+        """
+        set the number of frames per second to decode and analyze for motion
+        """
+        target_analysis_fps = float(target_analysis_fps)
+        if target_analysis_fps <= 0:
+            raise ValueError('Target analysis FPS must be a positive number')
+        self.target_analysis_fps = target_analysis_fps
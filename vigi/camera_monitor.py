@@ -2,17 +2,220 @@
 A module that implements the CameraMonitor class.
 """
 
+import time
 import threading
+import queue
 from datetime import datetime
-import time
 import logging
 
 import cv2
+import numpy as np
 
 from vigi.utils.fps_calculator import FPSCalculator
 from .utils.pub_sub import PubSub
+from .utils.capture import open_capture, is_network_stream
 from .database import Database
 
+# the number of processed frames between the FPS refreshes
+FPS_REFRESH_INTERVAL = 30
+
+# FPS reported by the camera above this value is considered invalid,
+# e.g. some RTSP streams report the 90 kHz clock rate as FPS
+MAX_CAMERA_FPS = 120
+
+# the delay before retrying to read a frame after an error grows exponentially
+# from RETRY_BASE_DELAY up to RETRY_MAX_DELAY seconds
+RETRY_BASE_DELAY = 0.01
+RETRY_MAX_DELAY = 1.0
+
+# the camera is reopened after this number of consecutive errors
+REOPEN_AFTER_ERRORS = 5
+
+# the decode stride is changed only when the ratio of the measured FPS to the target analysis FPS
+# differs from the current stride by more than this, so the FPS jitter doesn't flip it
+DECODE_STRIDE_HYSTERESIS = 0.6
+
+
+class _CaptureWorker(threading.Thread):
+    """
+    A thread that continuously grabs frames from the camera and decodes them into one of
+    two preallocated buffers (double buffering). While the consumer processes the frame
+    from one buffer, the next frame is decoded into the other one.
+    """
+
+    def __init__(self, camera, camera_id, frame_width, frame_height, max_errors=50,
+                 source=None):
+        """
+        camera: cv2.VideoCapture - an opened camera to read the frames from
+        camera_id: int - the ID of the camera, used for logging
+        frame_width, frame_height: int - the size of the frames to preallocate the buffers
+        max_errors: int - the maximum number of consecutive errors when reading
+                            a frame from the camera before the worker stops.
+        source: int or str - the camera ID or URL the camera was opened with,
+                            it's used to reopen the camera after several errors
+        """
+        super().__init__(daemon=True)
+
+        # the camera could be replaced by the worker when it's reopened
+        self.camera = camera
+        self.camera_id = camera_id
+        self.max_errors = max_errors
+        self.source = source
+
+        # decode only every Nth grabbed frame, unless decode_all() returns True
+        self.decode_stride = 1
+        self.decode_all = lambda: False
+
+        # called on every successfully grabbed frame
+        self.on_grab = lambda: None
+
+        # A grab() that returns faster than this (in seconds) takes a frame that was already
+        # buffered by the backend while we were busy, i.e. a stale frame. Up to max_drained
+        # stale frames in a row are dropped without decoding, so we catch up with the camera.
+        # 0 disables dropping, it's set by the camera monitor when the camera's FPS is known.
+        self.stale_grab_time = 0
+        self.max_drained = 0
+
+        self._buffers = [np.empty((frame_height, frame_width, 3), dtype=np.uint8),
+                         np.empty((frame_height, frame_width, 3), dtype=np.uint8)]
+        # the index of the buffer the worker decodes the frames into,
+        # the other buffer belongs to the consumer
+        self._write_idx = 0
+        # True if the write buffer contains a frame the consumer hasn't seen yet
+        self._fresh = False
+        # True when the worker has stopped and no more frames will be decoded
+        self._finished = False
+
+        self._lock = threading.Lock()
+        self._frame_ready = threading.Condition(self._lock)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        error_count = 0
+        frame_idx = 0
+        drained = 0
+        while not self._stop_event.is_set():
+            # grab() only fetches the frame from the camera, without decoding it,
+            # retrieve() decodes the grabbed frame, which is the expensive part
+            grab_started = time.monotonic()
+            success = self.camera.grab()
+            grab_time = time.monotonic() - grab_started
+            if success:
+                frame_idx += 1
+                self.on_grab()
+
+                if not self.decode_all():
+                    if grab_time < self.stale_grab_time and drained < self.max_drained:
+                        # drop the stale frame, the motion detection needs the freshest one
+                        drained += 1
+                        error_count = 0
+                        continue
+
+                    if drained > 0:
+                        logging.debug("Dropped %s stale frame(s) from the camera with ID=%s",
+                                      drained, self.camera_id)
+                        drained = 0
+
+                    if frame_idx % self.decode_stride != 0:
+                        # skip decoding of this frame, it's not needed for motion detection
+                        error_count = 0
+                        continue
+
+                with self._lock:
+                    if self._fresh and self.decode_all():
+                        # The video is being recorded, so every frame should reach the recorder.
+                        # Wait for the consumer to take the pending frame instead of overwriting
+                        # it. It throttles the capture when the processing falls behind.
+                        self._frame_ready.wait_for(
+                            lambda: not self._fresh or self._stop_event.is_set())
+                        if self._stop_event.is_set():
+                            break
+
+                    # retrieve() reuses the passed buffer if it has the right size
+                    success, frame = self.camera.retrieve(self._buffers[self._write_idx])
+                    if success:
+                        self._buffers[self._write_idx] = frame
+                        self._fresh = True
+                        self._frame_ready.notify()
+
+            if not success:
+                # If the camera fails to read a frame:
+                # - Increment the error count
+                # - Print an error message
+                # - Wait before retrying, the delay doubles with every consecutive error,
+                #   so a transient glitch doesn't stall the capture for long
+                # - Reopen the camera after several consecutive errors
+                #
+                # If the error count reaches the maximum number of consecutive errors:
+                # - print an error message and stop the worker
+
+                error_count += 1
+                if error_count >= self.max_errors:
+                    logging.fatal("Maximum number of consecutive errors (%s) reached. "
+                                  "Exiting.", self.max_errors)
+                    break
+
+                logging.error("Failed to read a frame from the camera with ID=%s",
+                              self.camera_id)
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** error_count)
+                if self._stop_event.wait(delay):
+                    break
+
+                # reconnect to network streams, local cameras are reopened only if they're closed
+                if self.source is not None and error_count % REOPEN_AFTER_ERRORS == 0 and \
+                        (is_network_stream(self.source) or not self.camera.isOpened()):
+                    self._reopen()
+                continue
+
+            # Reset the error count if a frame is successfully read
+            error_count = 0
+
+        # wake up the consumer waiting for a frame
+        with self._lock:
+            self._finished = True
+            self._frame_ready.notify_all()
+
+    def _reopen(self):
+        """
+        Release the camera and open it again, e.g. to reconnect to a network stream.
+        """
+        logging.warning("Reopening the camera with ID=%s", self.camera_id)
+        self.camera.release()
+        self.camera = open_capture(self.source)
+        if not self.camera.isOpened():
+            logging.error("Failed to reopen the camera with ID=%s", self.camera_id)
+
+    def latest(self, timeout=None):
+        """
+        Wait for a new frame and return it. Returns None if there is no new frame
+        within the timeout or the worker has stopped.
+        The returned buffer is valid until the next call of this method.
+        """
+        with self._lock:
+            if not self._frame_ready.wait_for(lambda: self._fresh or self._finished,
+                                              timeout=timeout):
+                return None
+            if not self._fresh:
+                return None
+
+            # swap the buffers: the freshly decoded one goes to the consumer,
+            # the one that the consumer has finished with is reused for decoding
+            read_idx = self._write_idx
+            self._write_idx = 1 - self._write_idx
+            self._fresh = False
+            # wake up the worker waiting for the frame to be taken
+            self._frame_ready.notify_all()
+            return self._buffers[read_idx]
+
+    def stop(self):
+        """
+        Stop the worker and wait for it to finish.
+        """
+        with self._lock:
+            self._stop_event.set()
+            self._frame_ready.notify_all()
+        self.join()
+
 
 class CameraMonitor(threading.Thread):
     """
@@ -21,7 +224,8 @@ class CameraMonitor(threading.Thread):
 
     def __init__(self, video_recorder = None, camera_id=0, max_errors=50,
                  add_seconds_after_motion=10, notifier=None, db_path=None,
-                 motion_detector=None):
+                 motion_detector=None, target_analysis_fps=10, frame_stream=None,
+                 camera_url=None):
         """
         max_errors: int - the maximum number of consecutive errors when reading
                             a frame from the camera before the camera monitor stops.
@@ -31,18 +235,26 @@ class CameraMonitor(threading.Thread):
                             video after the motion is detected
         notifier: Notifier - a notifier object to send notifications about the motion
         db_path: str - the path to the database file
+        target_analysis_fps: float - the number of frames per second to decode and
+                            pass to the motion detector when the video is not being
+                            recorded. Other frames are grabbed but not decoded.
+        frame_stream: PubSub - where to publish the frames, a new PubSub is created if not set
+        camera_url: str - the URL of a network camera (e.g. rtsp://...), if it's not set,
+                            the local camera with camera_id is used
         """
         super().__init__()
 
         self.notifier = notifier
 
         self.camera_id = camera_id
+        self.camera_url = camera_url
         self.max_errors = max_errors
         self.add_seconds_after_motion = add_seconds_after_motion
+        self.target_analysis_fps = target_analysis_fps
 
         # Initialize the PubSub object to stream the frames from the camera
         # so other parts of the application can access the stream of frames
-        self.frame_stream = PubSub()
+        self.frame_stream = frame_stream if frame_stream is not None else PubSub()
 
         self.motion_detector = motion_detector
 
@@ -52,6 +264,16 @@ class CameraMonitor(threading.Thread):
         # video_recorder is used to save the video to a file when motion is detected
         self.video_recorder = video_recorder
 
+        # Frames to be written by the video recorder. Writing is done in a separate
+        # thread, so the encoding doesn't block capturing and motion detection.
+        # The queue is bounded, so the main loop waits if the encoder falls behind.
+        self._write_q = queue.Queue(maxsize=4)
+
+        # Preallocated frames for the write queue. The recorded frames are copied into them,
+        # because the buffers of the capture worker are reused for the next frames.
+        # They are allocated in the run method when the frame size is known.
+        self._free_frames = queue.Queue()
+
         # save the start time of the camera monitor to calculate the uptime
         self.start_time = datetime.now()
 
@@ -80,20 +302,42 @@ class CameraMonitor(threading.Thread):
         self.frame_height = None
         self.camera_fps = None
 
+        # decode only every Nth frame when not recording, it's calculated in the run method
+        # when the camera's FPS is known
+        self._decode_stride = 1
+
+        # the last calculated FPS, it's refreshed in the run method
+        self._fps_cached = None
+
+        # the exception raised by the video recorder in the writer thread,
+        # it's re-raised in the run method to stop the camera monitor
+        self._write_error = None
+
     def current_fps(self):
         """
-        Returns the current FPS of the system using the FPS calculator if it has calculated the FPS,
-        otherwise returns the FPS of the camera.
+        Returns the current FPS of the system. It's cached and refreshed every
+        FPS_REFRESH_INTERVAL frames by the run method, so it's cheap to call.
+        Returns None if the camera hasn't been opened yet.
+        """
+        return self._fps_cached
+
+    def _calculate_fps(self):
+        """
+        Calculate the current FPS of the system using the FPS calculator if it has calculated
+        the FPS, otherwise returns the FPS of the camera.
         """
         fps = self.fps_calculator.current_fps()
-        logging.info("Calculated FPS = %s", fps)
         if fps is None:
             fps = int(self.camera_fps)
-            logging.warning("FPS is not calculated yet, using the camera's FPS = %s", fps)
-
-        if fps == 1:
-            logging.warning("The camera's FPS is 1, it seems to be invalid."
-                            "Setting the default FPS to 30.")
+            if fps != self._fps_cached:
+                logging.warning("FPS is not calculated yet, using the camera's FPS = %s", fps)
+        elif self._fps_cached is None or abs(fps - self._fps_cached) > 1:
+            # don't log the jitter of the measured FPS
+            logging.info("Calculated FPS = %s", fps)
+
+        if fps <= 1:
+            logging.warning("The camera's FPS is %s, it seems to be invalid."
+                            "Setting the default FPS to 30.", fps)
             fps = 30
 
         return fps
@@ -125,6 +369,21 @@ class CameraMonitor(threading.Thread):
                                             frame_height=self.frame_height,
                                             fps=self.current_fps())
 
+    def _set_capture_rate(self, capture_worker, fps):
+        """
+        Configure the capture worker for the given frame rate of the camera:
+        decode only every Nth frame for the motion detection and detect stale frames.
+        """
+        ratio = fps / self.target_analysis_fps
+        if abs(ratio - self._decode_stride) > DECODE_STRIDE_HYSTERESIS:
+            self._decode_stride = max(1, round(ratio))
+            logging.debug("Decoding every %s frame(s) for motion detection", self._decode_stride)
+        capture_worker.decode_stride = self._decode_stride
+
+        # a fresh frame takes about 1/FPS to arrive, a buffered one is returned at once
+        capture_worker.stale_grab_time = 0.5 / fps
+        capture_worker.max_drained = int(fps)
+
     def run(self):
         # Connect to the database. We need to connect to the database in the same
         # thread where it's used
@@ -132,13 +391,19 @@ class CameraMonitor(threading.Thread):
 
         # Initialize the camera with OpenCV
         logging.info("Starting camera monitor... ")
-        camera = cv2.VideoCapture(self.camera_id)  # Use 0 for the first webcam
+        # open the network stream if the URL is set, otherwise the local camera by its ID
+        source = self.camera_url or self.camera_id
+        camera = open_capture(source)
         if camera.isOpened():
             logging.info("Camera opened successfully.")
         else:
             logging.error("Camera with ID=%s could not be opened.", self.camera_id)
             return
 
+        writer = threading.Thread(target=self._write_frames, daemon=True)
+        writer.start()
+
+        capture_worker = None
         try:
             self.frame_width = camera.get(cv2.CAP_PROP_FRAME_WIDTH)
             self.frame_height = camera.get(cv2.CAP_PROP_FRAME_HEIGHT)
@@ -147,71 +412,159 @@ class CameraMonitor(threading.Thread):
                          "frame width: %s, frame height: %s, FPS: %s",
                          self.frame_width, self.frame_height, self.camera_fps)
 
-            error_count = 0
+            # Some cameras report FPS as 0 or a bogus value, it's measured in this case
+            if not (self.camera_fps and 0 < self.camera_fps <= MAX_CAMERA_FPS):
+                logging.warning("The camera reported an invalid FPS = %s, it will be measured",
+                                self.camera_fps)
+                self.camera_fps = 0
+
+            self._fps_cached = self._calculate_fps()
+
+            # the frame size is fixed for the camera, precompute the motion detector's state
+            self.motion_detector.specialize(int(self.frame_width), int(self.frame_height))
+
+            for _ in range(self._write_q.maxsize + 1):
+                self._free_frames.put(np.empty((int(self.frame_height), int(self.frame_width), 3),
+                                               dtype=np.uint8))
+
+            # Capturing and decoding is done in a separate thread, so it overlaps with
+            # the motion detection of the previous frame
+            capture_worker = _CaptureWorker(camera, self.camera_id,
+                                            frame_width=int(self.frame_width),
+                                            frame_height=int(self.frame_height),
+                                            max_errors=self.max_errors,
+                                            source=source)
+            # Motion detection doesn't need every frame, so we decode only every Nth frame
+            # when nothing is being recorded. Until the FPS is known, every frame is decoded.
+            if self.camera_fps > 0:
+                self._set_capture_rate(capture_worker, self.camera_fps)
+            # all frames should be decoded when the video is being recorded
+            capture_worker.decode_all = self.video_recorder.is_recording
+            # FPS is measured on grabbed frames, so it reflects the camera's
+            # frame rate that is used for the recordings
+            capture_worker.on_grab = self.fps_calculator.update
+            capture_worker.start()
+
+            # Bind the methods called on every frame to local variables,
+            # so they are not looked up on each iteration
+            latest_frame = capture_worker.latest
+            detect_motion = self.motion_detector.update
+            is_motion_detected = self.motion_detector.is_motion_detected
+            is_recording = self.video_recorder.is_recording
+            publish = self.frame_stream.publish
+            get_free_frame = self._free_frames.get
+            write_frame = self._write_q.put
+            copy_frame = np.copyto
+
+            frame_count = 0
             while not self.should_stop:
-                success, frame = camera.read()  # Read a frame from the camera
-                if not success:
-                    # If the camera fails to read a frame:
-                    # - Increment the error count
-                    # - Print an error message
-                    # - Sleep for 1 second
-                    #
-                    # If the error count reaches the maximum number of consecutive errors:
-                    # - print an error message and break the loop
-
-                    error_count += 1
-                    if error_count >= self.max_errors:
-                        logging.fatal("Maximum number of consecutive errors (%s) reached. "
-                                      "Exiting.", self.max_errors)
+                frame = latest_frame(timeout=1)
+                if frame is None:
+                    if not capture_worker.is_alive():
+                        # the capture worker has stopped because of the camera errors
                         break
 
-                    logging.error("Failed to read a frame from the camera with ID=%s",
-                                  self.camera_id)
-                    time.sleep(1)
+                    # no new frame yet, check if we should stop and wait again
                     continue
 
-                # Reset the error count if a frame is successfully read
-                error_count = 0
+                frame_count += 1
+                if frame_count % FPS_REFRESH_INTERVAL == 0:
+                    self._fps_cached = self._calculate_fps()
 
-                # Apply the motion detector to the frame
-                frame, detected_objects = self.motion_detector.update(frame)
+                    # The grab rate is measured while the capture isn't throttled
+                    # by the recording, it's more reliable than the camera's FPS
+                    measured_fps = self.fps_calculator.current_fps()
+                    if measured_fps and not is_recording():
+                        self._set_capture_rate(capture_worker, measured_fps)
+
+                # Apply the motion detector to the frame,
+                # it could start the recording through the motion callback
+                frame, detected_objects = detect_motion(frame)
 
                 # Add the detected objects to the set of detected objects
                 self.detected_objects.update(detected_objects)
 
                 # Publish the frame to the frame stream
-                self.frame_stream.publish(frame)
+                publish(frame)
+
+                # Nothing else to do if the video is not being recorded
+                if not is_recording():
+                    continue
 
-                # if motion is not detected anymore and the video is being recorded, then
-                # stop the recording
-                if not self.motion_detector.is_motion_detected() and \
-                        self.video_recorder.is_recording():
+                # The video is being recorded and the motion is over: count down
+                # the additional frames and stop the recording when they are recorded
+                if not is_motion_detected():
                     self.add_frames -= 1
                     if self.add_frames <= 0:
                         self.end_recording()
-
-                # here we send all frames to the video recorder, it's up to the
-                # video recorder to decide if it should record the frame or not.
-                # It could decide to record additional frames before and after
-                # the motion is detected
-                self.video_recorder.add_frame(frame)
-                self.fps_calculator.update()
+                        continue
+
+                # the writer thread has failed to write the video
+                if self._write_error is not None:
+                    raise self._write_error
+
+                # The video is being recorded: send the frame to the writer thread.
+                # If the encoder falls behind, the queue is full and this call blocks.
+                # The capture worker then waits for us to take the pending frame,
+                # so the back-pressure throttles the capture instead of dropping frames.
+                recorded_frame = get_free_frame()
+                if recorded_frame.shape != frame.shape:
+                    # the camera reported a wrong frame size
+                    recorded_frame = np.empty_like(frame)
+                copy_frame(recorded_frame, frame)
+                write_frame(recorded_frame, block=True)
 
         finally:
+            if capture_worker is not None:
+                capture_worker.stop()
+
             if self.video_recorder.is_recording():
                 self.end_recording()
 
+            # stop the writer thread
+            self._write_q.put(None)
+            writer.join()
+
             # OpenCV cleanup
             logging.info("Releasing the camera...")
+            if capture_worker is not None:
+                # the worker could have reopened the camera
+                camera = capture_worker.camera
             camera.release()
 
             # close the database connection to save the data
             self.database.close()
 
+    def _write_frames(self):
+        """
+        Write the frames from the write queue to the video recorder until
+        the None sentinel is received. Runs in a separate thread.
+        """
+        while True:
+            frame = self._write_q.get()
+            try:
+                if frame is None:
+                    break
+                if self._write_error is None:
+                    self.video_recorder.add_frame(frame)
+            except Exception as e: # pylint: disable=broad-except
+                # Keep draining the queue, so the run method isn't blocked on it,
+                # and pass the error to the run method to stop the camera monitor
+                logging.error("Failed to write a frame to the video: %s", e)
+                self._write_error = e
+            finally:
+                if frame is not None:
+                    # return the frame to the pool to be reused
+                    self._free_frames.put(frame)
+                self._write_q.task_done()
+
     def end_recording(self):
         """
         End the recording of the video to a file.
         """
+        # wait for the writer thread to write all the queued frames
+        self._write_q.join()
+
         self.database.add_recording(date=self.video_recorder.recording_start_date,
                                     time=self.video_recorder.recording_start_time,
                                     camera_id=self.camera_id, tags=','.join(self.detected_objects))
@@ -0,0 +1,103 @@
+"""
+A module that implements the CameraProcess class.
+"""
+
+import logging
+import multiprocessing
+from datetime import datetime
+
+from .utils.shared_frame_ring import SharedFrameRing
+
+# Processes are spawned rather than forked, so the child doesn't inherit the threads,
+# GPU contexts and the state of OpenCV from the parent process.
+_MP_CONTEXT = multiprocessing.get_context('spawn')
+
+
+class CameraProcess(_MP_CONTEXT.Process):
+    """
+    Runs a CameraMonitor in a separate process, so the camera monitors and the web server
+    don't compete for the GIL. The frames are streamed to the web server through shared
+    memory. It exposes the same interface as CameraMonitor that is used by the web console.
+    """
+
+    def __init__(self, monitor_factory, camera_id=0):
+        """
+        monitor_factory: callable - creates a CameraMonitor in the child process.
+                            It's called with the frame_stream keyword argument and should be
+                            picklable, e.g. a functools.partial of a module level function.
+        camera_id: int - the ID of the camera
+        """
+        super().__init__(daemon=True)
+
+        self.monitor_factory = monitor_factory
+        self.camera_id = camera_id
+
+        # save the start time of the camera monitor to calculate the uptime
+        self.start_time = datetime.now()
+
+        # the frames from the camera are published by the child process to the shared memory
+        self.frame_stream = SharedFrameRing(ctx=_MP_CONTEXT)
+
+        # camera parameters, they are updated by the child process
+        self._frame_width = _MP_CONTEXT.Value('d', 0)
+        self._frame_height = _MP_CONTEXT.Value('d', 0)
+        self._fps = _MP_CONTEXT.Value('i', 0)
+
+        self._stop_event = _MP_CONTEXT.Event()
+
+        # the child process doesn't inherit the logging configuration
+        self._log_level = logging.getLogger().level
+
+    @property
+    def frame_width(self):
+        """
+        The width of the camera frames, None if the camera is not opened yet.
+        """
+        return self._frame_width.value or None
+
+    @property
+    def frame_height(self):
+        """
+        The height of the camera frames, None if the camera is not opened yet.
+        """
+        return self._frame_height.value or None
+
+    def current_fps(self):
+        """
+        Returns the current FPS of the camera monitor, None if it's not known yet.
+        """
+        return self._fps.value or None
+
+    def run(self):
+        logging.getLogger().setLevel(self._log_level)
+
+        camera_monitor = self.monitor_factory(frame_stream=self.frame_stream)
+        camera_monitor.start()
+
+        try:
+            # update the camera parameters for the web console until we're asked to stop
+            while not self._stop_event.wait(1):
+                if not camera_monitor.is_alive():
+                    break
+
+                fps = camera_monitor.current_fps()
+                if fps is not None:
+                    self._frame_width.value = camera_monitor.frame_width
+                    self._frame_height.value = camera_monitor.frame_height
+                    self._fps.value = int(fps)
+        except KeyboardInterrupt:
+            # Ctrl+C is sent to the whole process group, stop gracefully
+            pass
+        finally:
+            camera_monitor.stop()
+            self.frame_stream.close()
+
+    def stop(self):
+        """
+        Gracefully shutdown the camera monitor process.
+        """
+        logging.info("Shutting down the camera monitor process...")
+        self._stop_event.set()
+
+        # wait for the camera monitor to stop
+        self.join()
@@ -9,8 +9,10 @@ import argparse
 import logging
 import configparser
 import atexit
+import functools
 import urllib.request
 
+import cv2
 from ultralytics import YOLO
 
 from vigi.configuration_manager import ConfigurationManager
@@ -22,12 +24,20 @@ from vigi.notifier import Notifier
 from vigi.app import app
 from vigi.video_recorder import VideoRecorder
 from vigi.camera_monitor import CameraMonitor
+from vigi.camera_process import CameraProcess
 from vigi.motion_detector import MotionDetector
+from vigi.batched_object_detector import BatchedObjectDetector
 
 from vigi.database import Database
 
 DEFAULT_MODEL_URL = "https://github.com/ultralytics/assets/releases/download/v8.1.0/yolov8n.pt"
 
+# Low latency options for the FFmpeg backend of OpenCV used by the network (RTSP) cameras.
+# TCP transport is used, because lost UDP packets corrupt the frames.
+# Can be overridden by setting the environment variable before running the agent.
+os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS",
+                      "rtsp_transport;tcp|fflags;nobuffer|flags;low_delay")
+
 
 def read_args():
     """
@@ -38,9 +48,15 @@ def read_args():
                         help="Enable debug mode", action='store_true')
     parser.add_argument("--no-monitor",
                         help="Disable the camera monitor", action='store_true')
+    parser.add_argument("--multiprocessing",
+                        help="Run each camera monitor in a separate process", action='store_true')
+    parser.add_argument("--opencl",
+                        help="Run the motion detection on GPU with OpenCL", action='store_true')
     parser.add_argument("--data-dir",
                         help="Directory to store the recordings", type=str)
     parser.add_argument("--camera-id", help="Camera ID to monitor", type=int)
+    parser.add_argument("--camera-url",
+                        help="URL of a network camera to monitor (e.g. rtsp://...)", type=str)
     parser.add_argument("--host",
                         help="Host to run the web server", type=str)
     parser.add_argument("--port",
@@ -53,6 +69,10 @@ def read_args():
                         help="Sensitivity of the motion detector, \
                             should be a float between 0 and 1",
                         type=float)
+    parser.add_argument("--target-analysis-fps",
+                        help="Number of frames per second to decode and analyze \
+                            for motion when not recording",
+                        type=float)
     parser.add_argument("--detection-model-file",
                         help="Path to the detection model file (YOLO's yolov8n.pt, by default)",
                         type=str)
@@ -160,6 +180,52 @@ def ensure_model_file() -> str:
 
     return app.configuration_manager.detection_model_file
 
+def create_camera_monitor(configuration_manager, camera_id, camera_config, notifier,
+                          object_detection_model_path, object_detection_model=None,
+                          frame_stream=None):
+    """
+    Create a camera monitor along with its video recorder and motion detector for one camera.
+    It's a module level function, so it could be pickled and called in a child process.
+    If object_detection_model is set, it's used instead of loading a new model
+    from object_detection_model_path, so the model could be shared between cameras.
+    """
+    logging.info("Initializing the video recorder... ")
+    video_recorder = VideoRecorder(
+        recording_path = configuration_manager.data_dir,
+        camera_id=camera_id
+    )
+    logging.info("Video recorder initialized successfully.")
+
+    if object_detection_model is None and object_detection_model_path:
+        logging.info("Initializing the object detection model with "
+                     "YOLO weights %s on device %s... ",
+                     object_detection_model_path,
+                     configuration_manager.inference_device)
+        object_detection_model = YOLO(object_detection_model_path)
+
+    # create a motion detector for each camera
+    motion_detector = MotionDetector(
+        object_detection_model = object_detection_model,
+        sensitivity = camera_config.sensitivity,
+        inference_device = configuration_manager.inference_device,
+        debug=configuration_manager.debug,
+        # OpenCL is switched on in main(), a child process uses it if it's available
+        use_opencl=configuration_manager.use_opencl and cv2.ocl.useOpenCL()
+    )
+
+    # create a camera monitor for each camera
+    return CameraMonitor(
+        video_recorder = video_recorder,
+        camera_id = camera_id,
+        max_errors = camera_config.max_errors,
+        notifier = notifier,
+        db_path = configuration_manager.db_path,
+        motion_detector = motion_detector,
+        target_analysis_fps = camera_config.target_analysis_fps,
+        frame_stream = frame_stream,
+        camera_url = camera_config.url
+    )
+
 def graceful_exit():
     """
     This function is called when the application exits by Ctrl+C or by any other reason.
@@ -200,6 +266,14 @@ def main():
 
     notifier = init_notifier(app.configuration_manager)
 
+    # OpenCV uses OpenCL by default if it's available, switch it on only if it's enabled
+    # in the configuration. The frames are small, so uploading them to GPU could cost
+    # more than it saves.
+    cv2.ocl.setUseOpenCL(app.configuration_manager.use_opencl and cv2.ocl.haveOpenCL())
+    if app.configuration_manager.use_opencl:
+        logging.info("OpenCL is %s for motion detection.",
+                     "enabled" if cv2.ocl.useOpenCL() else "not available")
+
     logging.info("Initializing the database... ")
     database = Database(app.configuration_manager.db_path)
     database.init_db()
@@ -216,40 +290,29 @@ def main():
         # this dictionary will hold the camera monitors for each camera
         app.camera_monitors = {}
 
-        for camera_id, camera_config in app.configuration_manager.cameras_config.items():
-            logging.info("Initializing the video recorder... ")
-            video_recorder = VideoRecorder(
-                recording_path = app.configuration_manager.data_dir,
-                camera_id=camera_id
-            )
-            logging.info("Video recorder initialized successfully.")
-
-            object_detection_model = None
-            if object_detection_model_path:
-                logging.info("Initializing the object detection model with "
-                             "YOLO weights %s on device %s... ",
-                             object_detection_model_path,
-                             app.configuration_manager.inference_device)
-                object_detection_model = YOLO(object_detection_model_path)
-
-            # create a motion detector for each camera
-            motion_detector = MotionDetector(
-                object_detection_model = object_detection_model,
-                sensitivity = camera_config.sensitivity,
-                inference_device = app.configuration_manager.inference_device,
-                debug=app.configuration_manager.debug
-            )
+        # When several cameras are monitored by threads of this process, they share one
+        # object detection model, and the frames from different cameras are detected in batches.
+        # In the multiprocessing mode, each process loads its own model.
+        shared_object_detection_model = None
+        cameras_count = len(app.configuration_manager.cameras_config)
+        if object_detection_model_path and cameras_count > 1 and \
+                not app.configuration_manager.multiprocessing:
+            logging.info("Sharing the object detection model with YOLO weights %s "
+                         "between %s cameras... ", object_detection_model_path, cameras_count)
+            shared_object_detection_model = BatchedObjectDetector(
+                YOLO(object_detection_model_path))
 
-            # create a camera monitor for each camera
+        for camera_id, camera_config in app.configuration_manager.cameras_config.items():
             logging.info("Starting the camera monitor for camera %s...", camera_id)
-            camera_monitor = CameraMonitor(
-                video_recorder = video_recorder,
-                camera_id = camera_id,
-                max_errors = camera_config.max_errors,
-                notifier = notifier,
-                db_path = app.configuration_manager.db_path,
-                motion_detector = motion_detector
-            )
+            monitor_factory = functools.partial(
+                create_camera_monitor, app.configuration_manager, camera_id, camera_config,
+                notifier, object_detection_model_path,
+                object_detection_model=shared_object_detection_model)
+            if app.configuration_manager.multiprocessing:
+                # the camera monitor is created in the child process
+                camera_monitor = CameraProcess(monitor_factory, camera_id=camera_id)
+            else:
+                camera_monitor = monitor_factory()
             camera_monitor.start()
             app.camera_monitors[camera_id] = camera_monitor
             logging.info("Camera monitor for camera %s started successfully.", camera_id)
@@ -22,6 +22,8 @@ class ConfigurationManager:
         self.smtp_server_config = None
         self.twilio_config = None
         self.no_monitor = False
+        self.multiprocessing = False
+        self.use_opencl = False
         self.db_path = os.path.join(self.data_dir, 'vigi.db')
         self.cameras_config = {}
         self.detection_model_file = os.path.join(user_data_dir('vigi-agent', 'Vigi'), 'yolov8n.pt')
@@ -98,6 +100,10 @@ class ConfigurationManager:
             self.set_detection_model_file(cmd_args.detection_model_file)
         if cmd_args.no_monitor:
             self.no_monitor = True
+        if cmd_args.multiprocessing:
+            self.multiprocessing = True
+        if cmd_args.opencl:
+            self.use_opencl = True
         if cmd_args.disable_detection:
             self.set_disable_detection(True)
         if cmd_args.inference_device:
@@ -116,10 +122,14 @@ class ConfigurationManager:
         camera_config = CameraConfig()
         camera_config.set_camera_id(camera_id)
 
+        if cmd_args.camera_url:
+            camera_config.set_url(cmd_args.camera_url)
         if cmd_args.max_errors:
             camera_config.set_max_errors(cmd_args.max_errors)
         if cmd_args.sensitivity:
             cmd_args.set_sensitivity(cmd_args.sensitivity)
+        if cmd_args.target_analysis_fps:
+            camera_config.set_target_analysis_fps(cmd_args.target_analysis_fps)
 
         self.cameras_config[camera_id] = camera_config
 
@@ -147,6 +157,10 @@ class ConfigurationManager:
             self.set_debug(default_config['Debug'] == 'True')
         if 'NoMonitor' in default_config:
             self.no_monitor = default_config['NoMonitor'] == 'True'
+        if 'Multiprocessing' in default_config:
+            self.multiprocessing = default_config['Multiprocessing'] == 'True'
+        if 'UseOpenCL' in default_config:
+            self.use_opencl = default_config['UseOpenCL'] == 'True'
         if 'DetectionModelFile' in default_config:
             self.set_detection_model_file(default_config['DetectionModelFile'])
         if 'DisableDetection' in default_config:
@@ -183,10 +197,16 @@ class ConfigurationManager:
             camera_config = CameraConfig()
             camera_config.set_camera_id(camera_config_info['CameraId'])
 
+            if 'Url' in camera_config_info:
+                camera_config.set_url(camera_config_info['Url'])
+
             if 'MaxErrors' in camera_config_info:
                 camera_config.set_max_errors(camera_config_info['MaxErrors'])
 
             if 'Sensitivity' in camera_config_info:
                 camera_config.set_sensitivity(camera_config_info['Sensitivity'])
 
+            if 'TargetAnalysisFps' in camera_config_info:
+                camera_config.set_target_analysis_fps(camera_config_info['TargetAnalysisFps'])
+
             self.cameras_config[camera_config.camera_id] = camera_config
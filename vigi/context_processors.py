@@ -27,7 +27,8 @@ def utility_processor():
             return "N/A"
 
         # format duration as n seconds, n minutes, n hours, n days, etc.
-        return humanize.precisedelta(datetime.timedelta(seconds=duration))
+        # the duration is a float, so round it to whole seconds
+        return humanize.precisedelta(datetime.timedelta(seconds=round(duration)))
 
     return dict(
             format_time=format_time,
@@ -8,18 +8,24 @@ import numpy as np
 from vigi.utils.spatial import boxes_intersect
 from vigi.utils.drawing import draw_bboxes, draw_bbox, draw_title
 
+# Motion detection doesn't need the full resolution, the frames are downscaled
+# to this width (keeping the aspect ratio) before the motion detection
+ANALYSIS_FRAME_WIDTH = 320
+
 class MotionDetector():
     """
     The MotionDetector class is used to detect motion in a video stream.
     """
     def __init__(self, object_detection_model=None, inference_device=None,
-                 debug=False, sensitivity=0.5):
+                 debug=False, sensitivity=0.5, use_opencl=False):
         """
         Initialize the motion detector with the given sensitivity and motion callback.
         The motion callback is called when motion is detected.
         sensitivity: float, the sensitivity of the motion detector, should be between 0 and 1
+        use_opencl: bool, run the image processing on GPU with OpenCL (OpenCV's T-API)
         """
         self.sensitivity = sensitivity
+        self.use_opencl = use_opencl
         self.back_sub = cv2.createBackgroundSubtractorMOG2(
             # the higher the sensitivity, the lower the threshold
             varThreshold=(50 / self.sensitivity),
@@ -33,6 +39,50 @@ class MotionDetector():
         self.inference_device = inference_device
         self.reset_motion_flag_after = 0
 
+        # the state that depends on the frame size, it's computed by specialize()
+        self._frame_size = None
+        self._analysis_size = None
+        self._scale = 1
+        self._cnt_area_thresh = 0
+        self._small_frame = None
+        self._gray_frame = None
+
+        # the values that depend only on the sensitivity are computed once
+        # the higher the sensitivity, the lower the threshold
+        self._min_thresh = 50 / self.sensitivity
+        # morphological operations kernel to fill in holes
+        self._kernel = np.array((15,15), dtype=np.uint8)
+
+    def specialize(self, frame_width, frame_height):
+        """
+        Precompute the state that depends on the frame size: the size of the analysis frame,
+        the scale, the contour area threshold and the buffers for the intermediate frames.
+        The camera monitor calls it once the frame size is known, otherwise it's called
+        by update() on the first frame or when the frame size changes.
+        """
+        self._frame_size = (frame_width, frame_height)
+
+        # Downscale the frame once, so all the following operations process fewer pixels.
+        # The detections are scaled back to the original frame size.
+        self._scale = frame_width / ANALYSIS_FRAME_WIDTH
+        if self._scale > 1:
+            self._analysis_size = (ANALYSIS_FRAME_WIDTH, round(frame_height / self._scale))
+        else:
+            self._scale = 1
+            self._analysis_size = None
+
+        # the higher the sensitivity, the lower the are threshold
+        # the threshold is in the pixels of the original frame, so it's scaled down
+        self._cnt_area_thresh = 2500 / self.sensitivity / (self._scale * self._scale)
+
+        # preallocate the intermediate frames, so they are not allocated for every frame
+        width, height = self._analysis_size or self._frame_size
+        self._small_frame = np.empty((height, width, 3), dtype=np.uint8)
+        if self.use_opencl:
+            self._gray_frame = cv2.UMat(height, width, cv2.CV_8UC1)
+        else:
+            self._gray_frame = np.empty((height, width), dtype=np.uint8)
+
     def set_motion_callback(self, motion_callback):
         """
         Set the motion callback that will be called when motion is detected.
@@ -48,12 +98,26 @@ class MotionDetector():
     def update(self, frame):
         """
         Update the motion detector with the current frame and return the
-        frame with the motion detection overlay.
+        frame with the motion detection overlay. The overlay is drawn on the given
+        frame in place, so copy it before if you need the original frame.
         """
-        original_frame = frame.copy()
+        original_frame = frame
+
+        if self._frame_size != (frame.shape[1], frame.shape[0]):
+            self.specialize(frame.shape[1], frame.shape[0])
+        scale = self._scale
+
+        if self._analysis_size is not None:
+            frame = cv2.resize(frame, self._analysis_size, dst=self._small_frame,
+                               interpolation=cv2.INTER_AREA)
+
+        # Upload the frame to GPU if OpenCL is used. All the following OpenCV
+        # operations on UMat run on GPU. The overlays are drawn on the original frame.
+        if self.use_opencl:
+            frame = cv2.UMat(frame)
 
         # convert the current frame to grayscale
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray_frame)
 
         # update the background model to get the foreground mask
         fg_mask = self.back_sub.apply(gray_frame)
@@ -67,15 +131,13 @@ class MotionDetector():
 
         # threshold the mask, the min_thresh value is set to 100 by default
         # this value roughly impacts the sensitivity of the motion detection
-        min_thresh = 50 / self.sensitivity # the higher the sensitivity, the lower the threshold
-        _, motion_mask = cv2.threshold(fg_mask, thresh = min_thresh,
+        _, motion_mask = cv2.threshold(fg_mask, thresh = self._min_thresh,
                                        maxval = 255, type = cv2.THRESH_BINARY)
 
         # median blur to remove granular noise
         motion_mask = cv2.medianBlur(motion_mask, ksize = 3)
 
-        # morphological operations to fill in holes
-        kernel = np.array((15,15), dtype=np.uint8)
+        kernel = self._kernel
 
         # morphologyEx with MORPH_OPEN is the same as erode followed by dilate
         motion_mask = cv2.morphologyEx(motion_mask, op = cv2.MORPH_OPEN,
@@ -90,15 +152,15 @@ class MotionDetector():
                                        method = cv2.CHAIN_APPROX_SIMPLE)
         detections = []
 
-        # the higher the sensitivity, the lower the are threshold
-        cnt_area_thresh = 2500 / self.sensitivity
+        cnt_area_thresh = self._cnt_area_thresh
         for cnt in contours:
             area = cv2.contourArea(cnt)
             if area > cnt_area_thresh:
                 x, y, w, h = cv2.boundingRect(cnt)
                 detections.append([x, y, x + w, y + h])
 
-        detections = np.array(detections)
+        # scale the detections back to the original frame size
+        detections = (np.array(detections) * scale).astype(int)
 
         if len(detections) > 0:
             # Motion detected!
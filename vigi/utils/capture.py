@@ -0,0 +1,156 @@
+"""
+This module contains utility functions to open video sources: local cameras and network streams.
+"""
+
+import sys
+import logging
+
+import cv2
+import numpy as np
+
+try:
+    # ffmpegcv is an optional dependency used for the network streams
+    import ffmpegcv
+except ImportError:
+    ffmpegcv = None
+
+NETWORK_STREAM_PREFIXES = ('rtsp://', 'http://', 'https://')
+
+def is_network_stream(source):
+    """
+    Returns True if the video source is a URL of a network stream.
+    """
+    return isinstance(source, str) and source.lower().startswith(NETWORK_STREAM_PREFIXES)
+
+def is_v4l2_device(source):
+    """
+    Returns True if the video source is a local camera that could be opened with
+    the Video4Linux2 backend: a camera ID or a /dev/videoN path on Linux.
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+    return isinstance(source, int) or \
+        (isinstance(source, str) and source.startswith('/dev/video'))
+
+def open_capture(source):
+    """
+    Open the video source and return an object with the cv2.VideoCapture interface.
+    source: int or str - the ID of a local camera or the URL of a network stream.
+
+    Network streams are opened with ffmpegcv's real-time stream reader if it's installed.
+    It runs FFmpeg in a separate process with the nobuffer and low_delay flags and doesn't
+    queue the decoded frames, so the latest frame is always read.
+    Otherwise, they are opened with OpenCV's FFmpeg backend, which is configured
+    with the OPENCV_FFMPEG_CAPTURE_OPTIONS environment variable.
+    """
+    if is_network_stream(source):
+        if ffmpegcv is not None:
+            try:
+                return FFmpegCVCapture(source)
+            except Exception as e: # pylint: disable=broad-except
+                logging.warning("Failed to open %s with ffmpegcv, falling back to OpenCV: %s",
+                                source, e)
+
+        camera = cv2.VideoCapture(source, cv2.CAP_FFMPEG)
+    else:
+        camera = None
+        if is_v4l2_device(source):
+            # OpenCV's V4L2 backend streams the frames through memory mapped driver buffers.
+            # It's selected explicitly, so OpenCV doesn't pick another backend
+            # (e.g. GStreamer) that copies each frame through its own pipeline.
+            camera = cv2.VideoCapture(source, cv2.CAP_V4L2)
+            if not camera.isOpened():
+                logging.info("Camera with ID=%s could not be opened with V4L2, "
+                             "trying other backends", source)
+                camera = None
+
+        if camera is None:
+            camera = cv2.VideoCapture(source)
+
+        # MJPEG is much cheaper to decode than the raw or H.264 streams
+        # and it's supported by most USB cameras
+        if camera.isOpened() and \
+                not camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG')):
+            logging.info("MJPEG format is not supported by the camera with ID=%s", source)
+
+    # By default, the backend buffers several frames, so when the processing
+    # is stalled, we would read outdated frames and detect motion late.
+    # Keep only the latest frame in the buffer.
+    if camera.isOpened() and not camera.set(cv2.CAP_PROP_BUFFERSIZE, 1):
+        logging.warning("Failed to reduce capture buffer size")
+
+    return camera
+
+
+class FFmpegCVCapture:
+    """
+    Wraps ffmpegcv's real-time stream capture into the cv2.VideoCapture interface used by
+    the camera monitor. The frames are decoded by FFmpeg in a separate process,
+    grab() reads the decoded frame and retrieve() returns it.
+
+    FFmpeg decodes every frame, so unlike OpenCV's capture, skipping retrieve()
+    for the frames that are not analyzed (the decode stride) doesn't save any decoding.
+    """
+    def __init__(self, url):
+        # VideoCaptureStreamRT passes "-fflags nobuffer -flags low_delay" to FFmpeg and
+        # doesn't queue the frames, unlike VideoCaptureStream that buffers up to 30 frames
+        self.capture = ffmpegcv.VideoCaptureStreamRT(url, pix_fmt='bgr24')
+        self.frame = None
+
+    def isOpened(self): # pylint: disable=invalid-name
+        """
+        Returns True if the stream is opened.
+        """
+        return self.capture.isOpened()
+
+    def get(self, prop_id):
+        """
+        Returns the frame width, height or FPS of the stream. Other properties are not supported.
+        """
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.capture.width
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.capture.height
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.capture.fps
+        return 0
+
+    def set(self, _prop_id, _value):
+        """
+        Properties can't be changed, FFmpeg is configured by ffmpegcv.
+        """
+        return False
+
+    def grab(self):
+        """
+        Read the next frame from the stream. The frame is already decoded by FFmpeg.
+        """
+        success, self.frame = self.capture.read()
+        return success
+
+    def retrieve(self, image=None):
+        """
+        Return the grabbed frame. It's copied into the image if it has the same size.
+        """
+        if self.frame is None:
+            return False, image
+
+        if image is not None and image.shape == self.frame.shape:
+            np.copyto(image, self.frame)
+            return True, image
+
+        return True, self.frame
+
+    def read(self, image=None):
+        """
+        Grab and return the next frame.
+        """
+        if not self.grab():
+            return False, image
+        return self.retrieve(image)
+
+    def release(self):
+        """
+        Close the stream.
+        """
+        self.capture.release()
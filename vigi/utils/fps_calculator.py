@@ -5,13 +5,20 @@ process a frame and then averaging the time over a number of frames.
 """
 
 import time
-from collections import deque
+
+# extra slots in the ring of timestamps, so the writer doesn't overwrite
+# the oldest timestamp while current_fps() is reading it from another thread
+RING_SLACK = 8
 
 class FPSCalculator():
     """
     This class is used to calculate the FPS of the system. It keeps track of
     the time it takes to process each frame and then averages the time over a
     number of frames to calculate the FPS.
+
+    The timestamps are stored in a preallocated ring, so update() is just one store
+    and one increment. It's safe to call update() from one thread and current_fps()
+    from another one without locking.
     """
     def __init__(self, max_history_size=100, min_history_size=20):
         """
@@ -20,22 +27,37 @@ class FPSCalculator():
         the FPS will be, but it will also be slower to react to changes
         """
         self.min_history_size = min_history_size
-        self.time_history = deque(maxlen=max_history_size)
-        self.old_time = time.time()
+        self.max_history_size = max_history_size
+
+        # the ring size is a power of two, so the index is computed with a bit mask
+        ring_size = 1 << (max_history_size + RING_SLACK - 1).bit_length()
+        self._mask = ring_size - 1
+        self._timestamps = [0] * ring_size
+        # the number of updates, the latest timestamp is at _count & _mask
+        self._count = 0
+        self._timestamps[0] = time.monotonic_ns()
 
     def update(self):
         """
         Tic the FPS calculator, this should be called once per frame
         """
-        new_time = time.time()
-        self.time_history.append(new_time - self.old_time)
-        self.old_time = new_time
+        count = self._count + 1
+        self._timestamps[count & self._mask] = time.monotonic_ns()
+        self._count = count
 
     def current_fps(self) -> int:
         """
         Returns the current FPS of the system
         """
-        if len(self.time_history) < self.min_history_size:
+        count = self._count
+        history_size = min(count, self.max_history_size)
+        if history_size < self.min_history_size:
+            return None
+
+        elapsed = self._timestamps[count & self._mask] - \
+            self._timestamps[(count - history_size) & self._mask]
+        if elapsed <= 0:
             return None
 
-        return int(1 / (sum(self.time_history) / len(self.time_history)))
+        # rounded rather than truncated, so e.g. 29.99 FPS is reported as 30
+        return round(history_size * 1_000_000_000 / elapsed)
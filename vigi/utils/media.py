@@ -2,13 +2,85 @@
 This module contains utility functions for working with media files.
 """
 
+import os
+import json
 import random
+import shutil
+import functools
+import subprocess
+from fractions import Fraction
 
 import cv2
 
 def read_video_file_meta(video_path):
     """
     Read the metadata of a video file and return it as a dictionary.
+    The metadata is cached until the file is modified.
+    """
+    try:
+        mtime = os.path.getmtime(video_path)
+    except OSError:
+        return None
+
+    meta = _read_video_file_meta_cached(video_path, mtime)
+    if meta is None:
+        return None
+
+    # return a copy, so the cached metadata couldn't be modified by the caller
+    return dict(meta)
+
+@functools.lru_cache(maxsize=1024)
+def _read_video_file_meta_cached(video_path, _mtime):
+    """
+    Read the metadata of a video file. The modification time of the file is a part
+    of the cache key, so the cache is invalidated when the file is modified.
+    """
+    # ffprobe reads the metadata from the container without initializing the decoder
+    if shutil.which('ffprobe'):
+        meta = _probe_video_file_meta(video_path)
+        if meta is not None:
+            return meta
+
+    return _read_video_file_meta_opencv(video_path)
+
+def _probe_video_file_meta(video_path):
+    """
+    Read the metadata of a video file with ffprobe.
+    The duration is read from the container, so the file is not scanned.
+    Returns None if the metadata could not be read.
+    """
+    try:
+        output = subprocess.run(['ffprobe', '-v', 'quiet', '-print_format', 'json',
+                                 '-select_streams', 'v:0', '-show_streams', '-show_format',
+                                 video_path],
+                                capture_output=True, timeout=10, check=True).stdout
+        meta = json.loads(output)
+        stream = meta['streams'][0]
+
+        fps = float(Fraction(stream['avg_frame_rate']))
+        duration = float(meta['format']['duration'])
+
+        # the number of frames is not stored in some containers, estimate it then
+        if 'nb_frames' in stream:
+            frame_count = int(stream['nb_frames'])
+        else:
+            frame_count = int(round(duration * fps))
+
+        return {
+            "frame_width": int(stream['width']),
+            "frame_height": int(stream['height']),
+            "fps": fps,
+            "frame_count": frame_count,
+            "duration": duration
+        }
+    except (OSError, subprocess.SubprocessError, ValueError,
+            KeyError, IndexError, ZeroDivisionError):
+        return None
+
+def _read_video_file_meta_opencv(video_path):
+    """
+    Read the metadata of a video file with OpenCV.
+    Returns None if the file could not be opened.
     """
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
@@ -18,7 +90,7 @@ def read_video_file_meta(video_path):
     frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     fps = cap.get(cv2.CAP_PROP_FPS)
     frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = int(frame_count / fps)
+    duration = frame_count / fps if fps > 0 else None
 
     cap.release()
 
@@ -1,42 +1,115 @@
 """
 A simple publish-subscribe (PubSub) class that allows multiple subscribers to
-receive messages from a single publisher on a single topic.
+receive frames from a single publisher on a single topic.
 """
 
-from queue import Queue
+import mmap
+import queue
 import threading
 
+import numpy as np
+
 class PubSub:
     """
     A simple publish-subscribe (PubSub) class that allows multiple subscribers to
-    receive messages from a single publisher on a single topic.
+    receive frames from a single publisher on a single topic.
+
+    The frames are stored in a ring of preallocated slots. The publisher copies each
+    frame into the next slot once, and the subscribers copy the latest published frame
+    from the ring only when they read it, instead of receiving a copy of every frame.
+    Slow subscribers skip frames, which is fine for the live streaming.
     """
-    def __init__(self):
-        self.subscribers = []
-        # Lock to prevent race conditions when accessing the list of
-        # subscribers from different threads
-        self.lock = threading.Lock()
+    def __init__(self, slots=4):
+        """
+        slots: int - the number of frames in the ring
+        """
+        self.slots = slots
+
+        # the number of published frames, the latest frame is in the slot (seq - 1) % slots
+        self._seq = 0
+        self._new_frame = threading.Condition()
+
+        # the ring is allocated when the first frame is published,
+        # because the frame size is not known in advance
+        self._buffer = None
+        self._frames = None
 
     def subscribe(self):
         """
-        Subscribe to the PubSub object and return a queue to receive messages.
+        Subscribe to the PubSub object and return a subscriber to receive frames.
         """
-        queue = Queue()
-        with self.lock:
-            self.subscribers.append(queue)
-        return queue
+        with self._new_frame:
+            return Subscriber(self, self._seq)
 
-    def unsubscribe(self, subscriber_queue):
+    def unsubscribe(self, subscriber):
         """
-        Unsubscribe from the PubSub object.
+        Unsubscribe from the PubSub object. Subscribers only read the ring
+        and don't hold any resources, so there is nothing to release.
         """
-        with self.lock:
-            self.subscribers.remove(subscriber_queue)
 
-    def publish(self, message):
+    def publish(self, frame):
+        """
+        Publish a frame to all the subscribers.
+        """
+        buffer, frames = self._buffer, self._frames
+        if frames is None or frames.shape[1:] != frame.shape or frames.dtype != frame.dtype:
+            buffer, frames = self._allocate(frame.shape, frame.dtype)
+
+        np.copyto(frames[self._seq % self.slots], frame)
+
+        with self._new_frame:
+            # A new ring is shared together with the frame written into it,
+            # so the subscribers never read an empty slot from it.
+            self._buffer, self._frames = buffer, frames
+            self._seq += 1
+            self._new_frame.notify_all()
+
+    def next_frame(self, seq, timeout=None):
+        """
+        Wait for a frame newer than the given sequence number and return a tuple
+        (sequence number, copy of the frame). Raises queue.Empty if there is no new frame
+        within the timeout.
+        """
+        while True:
+            with self._new_frame:
+                if not self._new_frame.wait_for(lambda: self._seq > seq, timeout=timeout):
+                    raise queue.Empty
+                seq = self._seq
+                frames = self._frames
+
+            # the frame is copied outside the lock, so the publisher isn't blocked
+            frame = frames[(seq - 1) % self.slots].copy()
+
+            # the publisher could overwrite the slot while we were copying it,
+            # in this case we wait for the next frame
+            if self._seq - seq < self.slots - 1:
+                return seq, frame
+
+    def _allocate(self, shape, dtype):
+        """
+        Allocate a ring for frames of the given shape and type and return
+        a tuple (buffer, frames). It's shared with the subscribers by publish().
+        """
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize * self.slots
+        # The previous buffer is not closed explicitly, because the subscribers
+        # could still be reading frames from it. It's released when garbage collected.
+        buffer = mmap.mmap(-1, size)
+        return buffer, np.ndarray((self.slots, *shape), dtype=dtype, buffer=buffer)
+
+
+class Subscriber:
+    """
+    A subscriber that receives the frames published to a PubSub object
+    (or any other object implementing next_frame()).
+    """
+    def __init__(self, pub_sub, seq):
+        self.pub_sub = pub_sub
+        self.seq = seq
+
+    def get(self, timeout=None):
         """
-        Publish a message to all the subscribers.
+        Wait for a new frame and return it. Raises queue.Empty if there is no new frame
+        within the timeout.
         """
-        with self.lock:
-            for subscriber in self.subscribers:
-                subscriber.put(message, block = False)
+        self.seq, frame = self.pub_sub.next_frame(self.seq, timeout=timeout)
+        return frame
@@ -0,0 +1,162 @@
+"""
+A ring buffer of video frames in shared memory. It's used to stream the frames from
+a camera monitor running in a separate process to the web server without pickling
+the frames through a queue.
+"""
+
+import queue
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .pub_sub import Subscriber
+
+# the maximum length of the shared memory block name
+MAX_NAME_LENGTH = 64
+
+
+class SharedFrameRing:
+    """
+    A single-producer, multiple-consumer ring buffer of frames in shared memory.
+    The producer writes each frame into the next slot, the consumers read the latest
+    written frame. Slow consumers skip frames, which is fine for the live streaming.
+    It has the same subscribe/unsubscribe interface as PubSub.
+    """
+    def __init__(self, slots=4, ctx=None):
+        """
+        slots: int - the number of frames in the ring
+        ctx: multiprocessing context that is used to start the producer process
+        """
+        ctx = ctx or multiprocessing.get_context()
+        self.slots = slots
+
+        # the number of published frames, the latest frame is in the slot (seq - 1) % slots
+        self._seq = ctx.Value('q', 0, lock=False)
+        self._new_frame = ctx.Condition()
+
+        # The shared memory is allocated by the producer when the first frame is published,
+        # because the frame size is not known in advance. Its name and the frame shape
+        # are shared with the consumers. The generation is incremented on each allocation.
+        self._name = ctx.Array('c', MAX_NAME_LENGTH, lock=False)
+        self._shape = ctx.Array('i', 3, lock=False)
+        self._generation = ctx.Value('i', 0, lock=False)
+
+        # process local state
+        self._shm = None
+        self._frames = None
+        self._attached_generation = 0
+        self._owner = False
+
+    def __getstate__(self):
+        # the shared memory block is attached in each process separately
+        state = self.__dict__.copy()
+        state['_shm'] = None
+        state['_frames'] = None
+        state['_attached_generation'] = 0
+        state['_owner'] = False
+        return state
+
+    def publish(self, frame):
+        """
+        Write the frame into the next slot of the ring. Called by the producer.
+        """
+        old_shm = None
+        reallocated = self._frames is None or self._frames.shape[1:] != frame.shape
+        if reallocated:
+            old_shm = self._shm
+            self._allocate(frame.shape)
+
+        seq = self._seq.value
+        np.copyto(self._frames[seq % self.slots], frame)
+
+        with self._new_frame:
+            if reallocated:
+                # The new block is shared together with the frame written into it,
+                # so the consumers never attach to a block without the latest frame
+                # or to a block that is already destroyed.
+                self._name.value = self._shm.name.encode()
+                self._shape[:] = frame.shape
+                self._generation.value += 1
+                self._attached_generation = self._generation.value
+            self._seq.value = seq + 1
+            self._new_frame.notify_all()
+
+        if old_shm is not None:
+            # the consumers that have attached to the old block keep their mappings
+            old_shm.close()
+            old_shm.unlink()
+
+    def subscribe(self):
+        """
+        Subscribe to the frames and return a subscriber to receive them.
+        """
+        with self._new_frame:
+            return Subscriber(self, self._seq.value)
+
+    def unsubscribe(self, subscriber):
+        """
+        Unsubscribe from the frames. Subscribers don't hold any resources of the ring,
+        so this method does nothing. It exists for the compatibility with PubSub.
+        """
+
+    def close(self):
+        """
+        Release the shared memory. The producer also destroys the shared memory block.
+        """
+        if self._shm is not None:
+            self._frames = None
+            self._shm.close()
+            if self._owner:
+                self._shm.unlink()
+            self._shm = None
+
+    def _allocate(self, shape):
+        """
+        Allocate a new shared memory block for frames of the given shape.
+        It's shared with the consumers when the first frame is published into it.
+        """
+        size = int(np.prod(shape)) * self.slots
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._owner = True
+        self._frames = np.ndarray((self.slots, *shape), dtype=np.uint8, buffer=self._shm.buf)
+
+    def _attach(self):
+        """
+        Attach to the shared memory block allocated by the producer. Called by the consumers.
+        """
+        # The previous block is not closed explicitly, because other threads could
+        # still be copying a frame from it. It's closed when garbage collected.
+        name = self._name.value.decode()
+        try:
+            # the consumer shouldn't destroy the memory block when it exits (Python 3.13+)
+            self._shm = shared_memory.SharedMemory( # pylint: disable=unexpected-keyword-arg
+                name=name, track=False)
+        except TypeError:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._frames = np.ndarray((self.slots, *self._shape), dtype=np.uint8,
+                                  buffer=self._shm.buf)
+        self._attached_generation = self._generation.value
+
+    def next_frame(self, seq, timeout=None):
+        """
+        Wait for a frame newer than the given sequence number and return a tuple
+        (sequence number, copy of the frame). Raises queue.Empty if there is no new frame
+        within the timeout. Called by the consumers.
+        """
+        while True:
+            with self._new_frame:
+                if not self._new_frame.wait_for(lambda: self._seq.value > seq, timeout=timeout):
+                    raise queue.Empty
+                seq = self._seq.value
+
+                if self._attached_generation != self._generation.value:
+                    self._attach()
+                frames = self._frames
+
+            frame = frames[(seq - 1) % self.slots].copy()
+
+            # the producer could overwrite the slot while we were copying it,
+            # in this case we wait for the next frame
+            if self._seq.value - seq < self.slots - 1:
+                return seq, frame
@@ -7,6 +7,8 @@ import time
 import logging
 import tempfile
 import shutil
+import subprocess
+import functools
 
 import cv2
 
@@ -16,6 +18,57 @@ DEFAULT_FPS = 25
 DEFAULT_FRAME_WIDTH = 640
 DEFAULT_FRAME_HEIGHT = 480
 
+# Hardware H.264 encoders of FFmpeg in the order of preference.
+# For each encoder: global FFmpeg options and output options.
+HARDWARE_ENCODERS = {
+    'h264_nvenc': ([], ['-preset', 'p1', '-tune', 'll', '-pix_fmt', 'yuv420p']),
+    'h264_qsv': ([], ['-preset', 'veryfast', '-pix_fmt', 'nv12']),
+    'h264_vaapi': (['-vaapi_device', '/dev/dri/renderD128'], ['-vf', 'format=nv12,hwupload']),
+    'h264_videotoolbox': ([], ['-realtime', '1', '-pix_fmt', 'yuv420p']),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _detect_encoder():
+    """
+    Find the first hardware H.264 encoder that is available in FFmpeg and works
+    on this machine. Returns None if FFmpeg is not installed or no hardware encoder
+    is available. The result is cached, so the detection is done only once.
+    """
+    if shutil.which('ffmpeg') is None:
+        logging.info("FFmpeg is not found, hardware video encoding is disabled.")
+        return None
+
+    try:
+        encoders = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                  capture_output=True, text=True, timeout=10,
+                                  check=True).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.warning("Failed to list FFmpeg encoders: %s", e)
+        return None
+
+    for encoder, (global_args, output_args) in HARDWARE_ENCODERS.items():
+        if encoder not in encoders:
+            continue
+
+        # the encoder could be compiled in, but the hardware could be missing,
+        # so we try to encode a short test video to check if it works
+        try:
+            result = subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error',
+                                     *global_args,
+                                     '-f', 'lavfi', '-i', 'color=black:s=256x256:d=0.1',
+                                     *output_args, '-c:v', encoder, '-f', 'null', '-'],
+                                    capture_output=True, timeout=10, check=False)
+        except (OSError, subprocess.SubprocessError):
+            continue
+
+        if result.returncode == 0:
+            logging.info("Using hardware video encoder: %s", encoder)
+            return encoder
+
+    logging.info("No hardware video encoder is available, using OpenCV's encoder.")
+    return None
+
 class VideoRecorder():
     """
     A class that records the video to a file.
@@ -26,9 +79,15 @@ class VideoRecorder():
         self.camera_id = camera_id
         self.recording_full_path = None
         self.video_writer = None
+        self.encoder_process = None
+        self.frame_size = None
         self.recording_start_time = None
         self.recording_start_date = None
 
+        # detect the hardware encoder once at startup, so the first recording
+        # doesn't wait for the FFmpeg test encodes
+        self.encoder = _detect_encoder()
+
     def start_recording(self, frame_width = None, frame_height = None, fps = None) -> None:
         """
         Start recording the video to a file.
@@ -63,6 +122,23 @@ class VideoRecorder():
                                                 f"camera_{self.camera_id}.mp4")
         logging.info("Recording video to: %s", self.recording_full_path)
 
+        self.frame_size = (int(frame_width), int(frame_height))
+
+        encoder = self.encoder
+        if encoder:
+            # encode the video on GPU with FFmpeg, raw BGR frames are piped to its stdin
+            global_args, output_args = HARDWARE_ENCODERS[encoder]
+            # the process outlives this method, it's finished in end_recording()
+            self.encoder_process = subprocess.Popen( # pylint: disable=consider-using-with
+                ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', *global_args,
+                 '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+                 '-s', f"{self.frame_size[0]}x{self.frame_size[1]}", '-r', str(int(fps)),
+                 '-i', '-',
+                 *output_args, '-c:v', encoder, '-movflags', '+faststart',
+                 '-f', 'mp4', self.recording_full_path],
+                stdin=subprocess.PIPE)
+            return
+
         # MPEG-4 Part 2 (Simple Profile) codec, doesn't work in Chrome
         # fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         # H.264 codec is not available on Apple M1,
@@ -72,7 +148,7 @@ class VideoRecorder():
             filename = self.recording_full_path,
             fourcc = fourcc,
             fps = int(fps),
-            frameSize = (int(frame_width), int(frame_height)),
+            frameSize = self.frame_size,
         )
 
     def end_recording(self) -> None:
@@ -81,7 +157,16 @@ class VideoRecorder():
         """
         logging.info("Ending video recording...")
         self.recording = False
-        self.video_writer.release()
+        if self.encoder_process:
+            # closing stdin signals FFmpeg to finish the file
+            try:
+                self.encoder_process.stdin.close()
+            except BrokenPipeError:
+                pass
+            self.encoder_process.wait()
+            self.encoder_process = None
+        else:
+            self.video_writer.release()
 
         # ensure that the recording path exists
         # if not, create the directory
@@ -131,5 +216,18 @@ class VideoRecorder():
         """
         if self.recording:
             # Add the frame to the video file
+            if self.encoder_process:
+                if (frame.shape[1], frame.shape[0]) != self.frame_size:
+                    # raw frames of a wrong size would corrupt the whole video
+                    logging.error("Frame size %sx%s doesn't match the video size %sx%s",
+                                  frame.shape[1], frame.shape[0], *self.frame_size)
+                    return
+
+                try:
+                    self.encoder_process.stdin.write(frame.tobytes())
+                except BrokenPipeError:
+                    logging.error("FFmpeg encoder process has exited unexpectedly.")
+                return
+
             self.video_writer.write(frame)
             return